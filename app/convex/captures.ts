@@ -142,6 +142,22 @@ export const updateStatus = mutation({
   },
 });
 
+// Claim a pending capture for local routing (route_inbox.py).
+// Moving it to "processing" atomically keeps the AI cron from picking it up.
+export const claimPending = mutation({
+  args: {
+    id: v.id("capture_queue"),
+  },
+  handler: async (ctx, args) => {
+    const capture = await ctx.db.get(args.id);
+    if (!capture || capture.status !== "pending") {
+      return { claimed: false, status: capture?.status ?? null };
+    }
+    await ctx.db.patch(args.id, { status: "processing" });
+    return { claimed: true, status: "processing" };
+  },
+});
+
 // Mark capture as done (after processing into a note)
 export const markDone = mutation({
   args: {
@@ -75,12 +75,19 @@ export const remove = mutation({
 });
 
 // Upsert a note (used by sync scripts - handles version tracking)
+// Large edits may send `delta` (see applyDelta) instead of `content`; the
+// delta is applied to the stored content only if it matches `baseChecksum`,
+// and the result must match `checksum`. Otherwise the caller gets
+// "baseMismatch"/"checksumMismatch" and should resend the full content.
 export const upsert = mutation({
   args: {
     jdId: v.string(),
     path: v.string(),
     title: v.string(),
-    content: v.string(),
+    content: v.optional(v.string()),
+    delta: v.optional(v.string()), // JSON line ops against the stored content
+    baseChecksum: v.optional(v.number()), // CRC32 of the content the delta is based on
+    checksum: v.optional(v.number()), // CRC32 of the content after applying the delta
     expectedVersion: v.optional(v.number()), // For conflict detection
   },
   handler: async (ctx, args) => {
@@ -100,16 +107,35 @@ export const upsert = mutation({
         };
       }
 
+      let content = args.content;
+      if (args.delta !== undefined) {
+        if (crc32(existing.content) !== args.baseChecksum) {
+          return { action: "baseMismatch", id: existing._id, currentVersion: existing.version };
+        }
+        content = applyDelta(existing.content, args.delta);
+        if (crc32(content) !== args.checksum) {
+          return { action: "checksumMismatch", id: existing._id, currentVersion: existing.version };
+        }
+      }
+      if (content === undefined) {
+        throw new Error("upsert requires content or delta");
+      }
+
       const newVersion = (existing.version ?? 0) + 1;
       await ctx.db.patch(existing._id, {
         jdId: args.jdId,
         title: args.title,
-        content: args.content,
+        content,
         updatedAt: Date.now(),
         version: newVersion,
       });
       return { action: "updated", id: existing._id, version: newVersion };
     } else {
+      if (args.content === undefined) {
+        // Nothing to apply a delta to
+        return { action: "baseMismatch" };
+      }
+
       const id = await ctx.db.insert("notes", {
         jdId: args.jdId,
         path: args.path,
@@ -123,6 +149,42 @@ export const upsert = mutation({
   },
 });
 
+// Apply a line delta produced by scripts/note_delta.py.
+// Ops run in order over the base's lines: [n] keeps the next n lines,
+// [-n] drops the next n lines, and ["text", ...] inserts those lines.
+function applyDelta(base: string, delta: string): string {
+  const baseLines = base.split("\n");
+  const ops: Array<number | string[]> = JSON.parse(delta);
+  const out: string[] = [];
+  let pos = 0;
+  for (const op of ops) {
+    if (typeof op === "number") {
+      if (op >= 0) {
+        out.push(...baseLines.slice(pos, pos + op));
+        pos += op;
+      } else {
+        pos -= op;
+      }
+    } else {
+      out.push(...op);
+    }
+  }
+  return out.join("\n");
+}
+
+// CRC32 of a string's UTF-8 bytes (matches Python's zlib.crc32)
+function crc32(text: string): number {
+  const bytes = new TextEncoder().encode(text);
+  let crc = 0xffffffff;
+  for (const byte of bytes) {
+    crc ^= byte;
+    for (let k = 0; k < 8; k++) {
+      crc = (crc >>> 1) ^ (0xedb88320 & -(crc & 1));
+    }
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
 // Delete a note by path (for when files are removed)
 export const deleteByPath = mutation({
   args: {
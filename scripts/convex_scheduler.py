@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+convex_scheduler.py - Adaptive concurrency for Convex HTTP calls
+
+This module:
+1. Wraps an httpx.Client with query() and mutation() helpers
+2. Keeps separate in-flight budgets for queries and mutations
+3. Grows each budget additively while calls are fast and succeed
+4. Halves a budget on throttling (429, 503, or any 5xx with Retry-After)
+   or when recent latency climbs well above its long-run average for the
+   same function and body size
+5. Retries throttled calls, honouring Retry-After when present
+6. Optionally gzips large request bodies (CONVEX_COMPRESS=1). Whether a
+   Convex deployment accepts Content-Encoding: gzip on /api/query and
+   /api/mutation has not been verified, so this is off by default. When on,
+   a 415 (or a 400 on the first compressed call that plain JSON then
+   fixes) switches the run back to plain JSON; other errors are raised.
+
+The sync scripts share one scheduler per run, so any parallel mode settles
+near what the deployment can actually sustain instead of a fixed constant.
+
+Usage:
+    with httpx.Client(timeout=30.0) as client:
+        scheduler = ConvexScheduler(client, CONVEX_URL)
+        notes = scheduler.query("notes:getForSync")
+        scheduler.mutation("captures:markSynced", {"ids": ids})
+"""
+
+import os
+import gzip
+import json
+import time
+import threading
+import httpx
+from sync_profiling import record
+
+# Tunables (overridable from the environment)
+INITIAL_LIMIT = float(os.getenv("CONVEX_INITIAL_CONCURRENCY", "4"))
+MAX_LIMIT = float(os.getenv("CONVEX_MAX_CONCURRENCY", "32"))
+MIN_LIMIT = 1.0
+DECREASE_FACTOR = 0.5
+LATENCY_TOLERANCE = 2.0  # Back off when recent latency is this many times the long-run average
+SHORT_SMOOTHING = 0.3    # EWMA weight of each call in the recent latency
+LONG_SMOOTHING = 0.005    # EWMA weight of each call in the long-run latency
+WARMUP_CALLS = 5         # Calls of a kind seen before its latency is judged
+MAX_RETRIES = 5
+DEFAULT_RETRY_AFTER = 1.0
+COMPRESS = os.getenv("CONVEX_COMPRESS", "0") == "1"
+COMPRESS_MIN_BYTES = 1024  # Smaller bodies aren't worth gzipping
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter using additive-increase/multiplicative-decrease.
+
+    The limit grows by roughly one slot per round-trip of successful calls
+    and is halved (at most once per round-trip) on throttling or latency
+    spikes.
+
+    Latency is tracked per key (function path and body size bucket, see
+    ConvexScheduler.call), since a 100 KB upsert is slower than a 1 KB one
+    without the deployment being any busier. A spike is a short-term
+    average well above the long-term one for the same key (an RTT
+    gradient), so noisy single calls don't halve the limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = INITIAL_LIMIT,
+        minimum: float = MIN_LIMIT,
+        maximum: float = MAX_LIMIT,
+    ):
+        self.name = name
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.latencies = {}  # key -> {"calls", "short", "long"} in seconds
+        self.last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until a slot is free under the current limit."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, throttled: bool = False, key=None) -> None:
+        """Free a slot and adjust the limit from the observed outcome."""
+        with self._cond:
+            self.in_flight -= 1
+
+            if throttled:
+                self._decrease(latency)
+            elif self._observe(key, latency):
+                self._decrease(latency)
+            elif self.in_flight + 1 >= int(self.limit):
+                # Only grow when the budget is actually being used
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+            self._cond.notify_all()
+
+    def _observe(self, key, latency: float) -> bool:
+        """
+        Fold a successful call into the smoothed latencies for its key.
+        Returns True if recent calls are well above the long-run average.
+        """
+        stats = self.latencies.get(key)
+        if stats is None:
+            self.latencies[key] = {"calls": 1, "short": latency, "long": latency}
+            return False
+
+        stats["calls"] += 1
+        stats["short"] += (latency - stats["short"]) * SHORT_SMOOTHING
+        stats["long"] += (latency - stats["long"]) * LONG_SMOOTHING
+        return (
+            stats["calls"] >= WARMUP_CALLS
+            and stats["short"] > stats["long"] * LATENCY_TOLERANCE
+        )
+
+    def _decrease(self, latency: float) -> None:
+        """Halve the limit, ignoring signals from calls already in flight."""
+        now = time.monotonic()
+        if now - self.last_decrease < latency:
+            return
+        self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+        self.last_decrease = now
+
+
+class ConvexScheduler:
+    """Run Convex queries and mutations under adaptive concurrency limits."""
+
+    def __init__(self, client: httpx.Client, convex_url: str, compress: bool = COMPRESS):
+        self.client = client
+        self.convex_url = convex_url
+        self.compress = compress
+        self.compression_checked = False  # Set once a gzipped call gets a verdict
+        self.limiters = {
+            "query": AdaptiveLimiter("query"),
+            "mutation": AdaptiveLimiter("mutation"),
+        }
+
+    def query(self, path: str, args: dict = None, trace: tuple = None):
+        """Call a Convex query and return its value."""
+        return self.call("query", path, args, trace)
+
+    def mutation(self, path: str, args: dict = None, trace: tuple = None):
+        """Call a Convex mutation and return its value."""
+        return self.call("mutation", path, args, trace)
+
+    def call(self, kind: str, path: str, args: dict = None, trace: tuple = None):
+        """
+        Call a Convex function of the given kind ('query' or 'mutation').
+        Retries throttled calls (see is_throttled) and raises
+        httpx.HTTPStatusError for other failures.
+        trace, if given, is (stage, item, size) for the profiling slow log;
+        it records only time spent on the wire, not waiting for a slot.
+        """
+        limiter = self.limiters[kind]
+        body = json.dumps({"path": path, "args": args or {}}).encode("utf-8")
+
+        attempt = 0
+        round_trip = 0.0
+        probing = False
+        while True:
+            compressed = self.compress and len(body) >= COMPRESS_MIN_BYTES
+            headers = {"Content-Type": "application/json"}
+            content = body
+            if compressed:
+                headers["Content-Encoding"] = "gzip"
+                content = gzip.compress(body)
+
+            # Latency is compared between calls of the same function and
+            # similar body size (power-of-two buckets)
+            key = (path, len(content).bit_length())
+
+            limiter.acquire()
+            start = time.monotonic()
+            throttled = True  # Transport errors count as overload
+            try:
+                response = self.client.post(
+                    f"{self.convex_url}/api/{kind}",
+                    content=content,
+                    headers=headers,
+                )
+                throttled = is_throttled(response)
+            finally:
+                elapsed = time.monotonic() - start
+                round_trip += elapsed
+                limiter.release(elapsed, throttled, key)
+
+            if compressed and response.status_code == 415:
+                # Deployment doesn't accept gzip; send plain JSON from now on
+                self.compress = False
+                continue
+            if compressed and not self.compression_checked and response.status_code == 400:
+                # First gzipped call failed: resend it plain to tell "can't
+                # decode gzip" apart from a genuinely bad request
+                self.compress = False
+                probing = True
+                continue
+            if compressed and response.status_code < 400:
+                self.compression_checked = True
+            if probing:
+                probing = False
+                if response.status_code == 400:
+                    # Plain JSON fails too, so gzip wasn't the problem
+                    self.compress = True
+
+            if throttled and attempt < MAX_RETRIES:
+                time.sleep(retry_delay(response, attempt))
+                attempt += 1
+                continue
+
+            if trace:
+                record(*trace, round_trip)
+            response.raise_for_status()
+            return response.json().get("value")
+
+
+def is_throttled(response: httpx.Response) -> bool:
+    """
+    Whether a response means the deployment is overloaded rather than the
+    call being bad: 429, 503, or any 5xx that asks us to come back later.
+    """
+    if response.status_code in (429, 503):
+        return True
+    return response.status_code >= 500 and "Retry-After" in response.headers
+
+
+def retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a throttled call."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return DEFAULT_RETRY_AFTER * (2 ** attempt)
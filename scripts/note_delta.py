@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+note_delta.py - Line deltas against the last-synced copy of each note
+
+This module:
+1. Caches the content Convex holds for each note in second-brain/.sync_base/
+2. Builds a compact line delta from that base to the local content
+3. Computes CRC32 checksums the server uses to verify base and result
+
+The delta is a JSON list of ops applied in order over the base's lines
+(mirrored by applyDelta in app/convex/notes.ts):
+    n             keep the next n lines
+    -n            drop the next n lines
+    ["a", "b"]    insert these lines
+
+Usage:
+    base = load_base(path)
+    delta = make_delta(base, content) if base is not None else None
+    if delta:
+        args.update(delta=delta, baseChecksum=checksum(base), checksum=checksum(content))
+"""
+
+import os
+import json
+import threading
+import zlib
+import difflib
+from pathlib import Path
+
+# Configuration
+REPO_ROOT = Path(__file__).parent.parent
+SECOND_BRAIN = REPO_ROOT / "second-brain"
+BASE_DIR = SECOND_BRAIN / ".sync_base"
+
+# Only bother with deltas for notes at least this large...
+DELTA_MIN_BYTES = 2048
+# ...and only when the delta is well under the full content
+DELTA_MAX_RATIO = 0.5
+
+
+def checksum(text: str) -> int:
+    """CRC32 of the UTF-8 encoded text (matches crc32 in notes.ts)."""
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def base_path(path: str) -> Path:
+    """Location of the cached base for a note path (relative to second-brain)."""
+    return BASE_DIR / path
+
+
+def load_base(path: str) -> str | None:
+    """Content Convex held for this note at the last sync, if cached."""
+    try:
+        with open(base_path(path), "r", encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def save_base(path: str, content: str) -> None:
+    """Cache the content Convex now holds for this note."""
+    filepath = base_path(path)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per writer, so concurrent saves of the same note can't collide
+    tmp_file = filepath.with_name(f"{filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_file, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    os.replace(tmp_file, filepath)
+
+
+def remove_base(path: str) -> None:
+    """Forget the cached base for a note that no longer exists."""
+    try:
+        base_path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def make_delta(base: str, content: str) -> str | None:
+    """
+    Encode content as a line delta against base.
+    Returns None when a delta would not be worth sending. Unchanged content
+    encodes as the trivial delta [n], so re-syncing an untouched large note
+    sends a few bytes instead of the whole body.
+    """
+    if len(content) < DELTA_MIN_BYTES:
+        return None
+
+    base_lines = base.split("\n")
+    new_lines = content.split("\n")
+    ops = []
+
+    matcher = difflib.SequenceMatcher(None, base_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(new_lines[j1:j2])
+
+    delta = json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+    if len(delta) > len(content) * DELTA_MAX_RATIO:
+        return None
+    return delta
+
+
+def apply_delta(base: str, delta: str) -> str:
+    """Apply a delta from make_delta() to base (the client-side mirror of applyDelta)."""
+    base_lines = base.split("\n")
+    out = []
+    pos = 0
+    for op in json.loads(delta):
+        if isinstance(op, list):
+            out.extend(op)
+        elif op >= 0:
+            out.extend(base_lines[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "\n".join(out)
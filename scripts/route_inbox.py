@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+route_inbox.py - Route obvious inbox captures locally, without an LLM call
+
+This script:
+1. Builds a compact term index of existing notes (jdId, title, body terms),
+   only once a text capture needs scoring. Each note's terms are cached in
+   _route_index.json and re-read only when the file changes.
+2. Scores each capture stub in inbox/new/ against that index
+3. For high-confidence matches on captures still pending in Convex:
+   - Claims the capture (pending -> processing) so the AI cron skips it
+   - Appends the capture text (with a *Captured:* date/id line) to the
+     target note and upserts it to Convex
+   - Marks the capture done in Convex
+   - Moves the stub to inbox/processed/ with final_destination recorded
+   If the upsert fails, the note is restored and the capture released
+   back to pending for the AI.
+4. Leaves ambiguous captures in inbox/new/ for the model
+
+Usage:
+    python route_inbox.py              # Route all stubs in inbox/new/
+    python route_inbox.py --dry-run    # Show routing decisions only
+"""
+
+import os
+import sys
+import re
+import math
+import json
+import time
+import httpx
+from pathlib import Path
+from datetime import datetime
+from collections import Counter
+from dotenv import load_dotenv
+
+try:
+    import frontmatter
+except ImportError:
+    print("Error: python-frontmatter not installed")
+    print("Run: pip install python-frontmatter")
+    sys.exit(1)
+
+from convex_scheduler import ConvexScheduler
+from vault_scanner import is_clean
+from sync_notes import (
+    find_all_notes,
+    extract_jd_id,
+    extract_title,
+    get_relative_path,
+    load_sync_state,
+    save_sync_state,
+    sync_note,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+CONVEX_URL = os.getenv("NEXT_PUBLIC_CONVEX_URL") or os.getenv("CONVEX_URL")
+REPO_ROOT = Path(__file__).parent.parent
+SECOND_BRAIN = REPO_ROOT / "second-brain"
+INBOX_NEW = SECOND_BRAIN / "inbox" / "new"
+INBOX_PROCESSED = SECOND_BRAIN / "inbox" / "processed"
+ROUTE_INDEX_FILE = SECOND_BRAIN / "_route_index.json"
+ROUTE_INDEX_VERSION = 1
+
+# Routing thresholds
+MIN_SCORE = 0.35      # Cosine similarity the best note must reach
+MIN_MARGIN = 1.5      # Best score must beat the runner-up by this factor
+MAX_BODY_TERMS = 64   # Body terms kept per note in the index
+TITLE_WEIGHT = 3.0    # Title terms count this many times a body term
+
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can",
+    "had", "her", "was", "one", "our", "out", "has", "his", "how", "its",
+    "who", "did", "get", "him", "she", "too", "use", "that", "with", "have",
+    "this", "will", "your", "from", "they", "been", "were", "what", "when",
+    "them", "then", "than", "into", "some", "also", "just", "need", "needs",
+    "about", "there", "their", "these", "those", "would", "could", "should",
+    "note", "notes", "split", "remember",
+}
+
+# JD IDs only count when written as a reference ([[40.03]], [[40.03-movies-tv]],
+# jd:40.03), not bare numbers like prices, times or versions
+JD_ID_PATTERN = re.compile(r"\[\[\s*(\d{2}\.\d{2})\b|\bjd:\s*(\d{2}\.\d{2})\b", re.IGNORECASE)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens, minus stopwords and very short words."""
+    words = re.findall(r"[a-z0-9][a-z0-9']+", text.lower())
+    return [w.strip("'") for w in words if len(w) > 2 and w not in STOPWORDS]
+
+
+def load_term_cache() -> dict:
+    """Load cached per-note terms from _route_index.json."""
+    if ROUTE_INDEX_FILE.exists():
+        try:
+            with open(ROUTE_INDEX_FILE, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") == ROUTE_INDEX_VERSION:
+                return cache["notes"]
+        except (OSError, ValueError, KeyError):
+            pass
+    return {}
+
+
+def save_term_cache(notes: dict) -> None:
+    """Save per-note terms to _route_index.json."""
+    with open(ROUTE_INDEX_FILE, "w") as f:
+        json.dump({"version": ROUTE_INDEX_VERSION, "notes": notes}, f)
+
+
+def note_terms(filepath: Path, cached: dict | None) -> dict:
+    """
+    jdId, title and raw term counts for one note, reusing the cached record
+    while the file's size and mtime are unchanged (and not racily clean,
+    see vault_scanner.is_clean).
+    """
+    stat = os.stat(filepath)
+    if cached and cached["size"] == stat.st_size and is_clean(cached, stat.st_mtime_ns):
+        return cached
+
+    listed_at_ns = time.time_ns()
+    with open(filepath, "r", encoding="utf-8") as f:
+        content = frontmatter.load(f)
+
+    title = extract_title(filepath, content)
+    terms = Counter(dict(Counter(tokenize(content.content)).most_common(MAX_BODY_TERMS)))
+    for term in tokenize(title):
+        terms[term] += TITLE_WEIGHT
+
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "listed_at_ns": listed_at_ns,
+        "jdId": extract_jd_id(filepath, content),
+        "title": title,
+        "terms": dict(terms),
+    }
+
+
+def build_note_index() -> dict:
+    """
+    Build the term index of existing notes.
+    Returns {"notes": [...], "idf": {term: weight}} where each note has
+    path, name, jdId, title and a unit-length TF-IDF vector.
+    """
+    cache = load_term_cache()
+    new_cache = {}
+    entries = []
+    doc_freq = Counter()
+
+    for filepath in find_all_notes():
+        path = get_relative_path(filepath)
+        try:
+            record = note_terms(filepath, cache.get(path))
+        except FileNotFoundError:
+            continue
+        new_cache[path] = record
+
+        # Area index notes (X0.00) are tables of contents, not destinations
+        if record["jdId"].endswith(".00"):
+            continue
+
+        terms = Counter(record["terms"])
+        entries.append({
+            "path": path,
+            "name": filepath.stem.lower(),
+            "jdId": record["jdId"],
+            "title": record["title"],
+            "terms": terms,
+        })
+        doc_freq.update(terms.keys())
+
+    save_term_cache(new_cache)
+
+    total = len(entries)
+    idf = {term: math.log((1 + total) / (1 + df)) + 1.0 for term, df in doc_freq.items()}
+
+    for entry in entries:
+        entry["vector"] = weigh(entry.pop("terms"), idf)
+
+    return {"notes": entries, "idf": idf}
+
+
+def weigh(terms: Counter, idf: dict) -> dict:
+    """Turn raw term counts into a unit-length TF-IDF vector."""
+    vector = {t: (1 + math.log(c)) * idf[t] for t, c in terms.items() if t in idf and c > 0}
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return {}
+    return {t: w / norm for t, w in vector.items()}
+
+
+def mentions_note(text: str, mentioned: set[str], note: dict) -> bool:
+    """Whether a capture explicitly references a note by JD ID or filename."""
+    return note["jdId"] in mentioned or note["name"] in text.lower()
+
+
+def score_capture(text: str, index: dict) -> list[tuple[float, dict]]:
+    """Score a capture against every indexed note, best match first."""
+    mentioned = {a or b for a, b in JD_ID_PATTERN.findall(text)}
+
+    query = weigh(Counter(tokenize(text)), index["idf"])
+    scored = []
+    for note in index["notes"]:
+        score = sum(w * note["vector"].get(t, 0.0) for t, w in query.items())
+        # An explicit reference is as confident as it gets, as long as the
+        # capture also shares some terms with the note
+        if score > 0 and mentions_note(text, mentioned, note):
+            score = 1.0
+        scored.append((score, note))
+
+    scored.sort(key=lambda s: s[0], reverse=True)
+    return scored
+
+
+def pick_route(text: str, index: dict) -> tuple[dict | None, float]:
+    """
+    Decide where a capture goes.
+    Returns (note, score), with note None when the match is ambiguous.
+    """
+    scored = score_capture(text, index)
+    if not scored:
+        return None, 0.0
+
+    best_score, best = scored[0]
+    runner_up = scored[1][0] if len(scored) > 1 else 0.0
+
+    if best_score < MIN_SCORE or best_score < runner_up * MIN_MARGIN:
+        return None, best_score
+    return best, best_score
+
+
+def append_to_note(note_path: str, text: str, capture_id: str, captured_at) -> str:
+    """
+    Append capture text to the end of an existing note, attributed the same
+    way as captures the AI files (*Captured:* date (capture id)), so a
+    misroute can be found and undone. Returns the original text.
+    """
+    filepath = SECOND_BRAIN / note_path
+    with open(filepath, "r", encoding="utf-8") as f:
+        existing = f.read()
+
+    # captured_at is a datetime once YAML has parsed it, but may be a string
+    date = str(captured_at)[:10] if captured_at else datetime.now().strftime("%Y-%m-%d")
+    attribution = f"*Captured:* {date} ({capture_id})"
+
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(existing.rstrip("\n") + "\n\n" + text.strip() + "\n\n" + attribution + "\n")
+
+    return existing
+
+
+def restore_note(note_path: str, original: str) -> None:
+    """Undo append_to_note()."""
+    with open(SECOND_BRAIN / note_path, "w", encoding="utf-8") as f:
+        f.write(original)
+
+
+def claim_capture(scheduler: ConvexScheduler, convex_id: str) -> tuple[bool, str | None]:
+    """
+    Atomically move a capture from pending to processing in Convex.
+    Returns (claimed, status); status is the capture's current status.
+    """
+    value = scheduler.mutation("captures:claimPending", {"id": convex_id}) or {}
+    return bool(value.get("claimed")), value.get("status")
+
+
+def release_capture(scheduler: ConvexScheduler, convex_id: str) -> None:
+    """Hand a claimed capture back to the AI cron."""
+    scheduler.mutation("captures:updateStatus", {"id": convex_id, "status": "pending"})
+
+
+def upload_routed_note(scheduler: ConvexScheduler, note_path: str, sync_state: dict) -> dict:
+    """
+    Upsert a note we just appended to, recording its new version in sync_state.
+    Raises RuntimeError unless Convex accepted the update.
+    """
+    result = sync_note(scheduler, SECOND_BRAIN / note_path, state=sync_state)
+    if result["action"] not in ("created", "updated"):
+        raise RuntimeError(f"upsert returned {result['action']}")
+
+    sync_state.setdefault("notes", {})[result["path"]] = {
+        "version": result["version"],
+        "synced_at": datetime.utcnow().isoformat(),
+    }
+    return result
+
+
+def move_to_processed(stub_path: Path, note: dict, score: float) -> Path:
+    """Move a stub to inbox/processed/, recording the routed destination."""
+    INBOX_PROCESSED.mkdir(parents=True, exist_ok=True)
+
+    with open(stub_path, "r", encoding="utf-8") as f:
+        raw = f.read()
+
+    # Insert routing fields before the closing frontmatter delimiter,
+    # keeping the stub's hand-written frontmatter format intact
+    routing = (
+        f"final_destination: {json.dumps('../' + note['path'])}\n"
+        f"routed_by: local\n"
+        f"route_score: {score:.2f}\n"
+    )
+    end_idx = raw.find("\n---", 3)
+    if end_idx != -1:
+        raw = raw[:end_idx + 1] + routing + raw[end_idx + 1:]
+
+    dest = INBOX_PROCESSED / stub_path.name
+    with open(dest, "w", encoding="utf-8") as f:
+        f.write(raw)
+    stub_path.unlink()
+
+    return dest
+
+
+def route_stubs(stub_paths: list[Path], scheduler: ConvexScheduler = None, dry_run: bool = False) -> tuple[int, int]:
+    """
+    Route capture stubs against the local note index.
+    A scheduler is required unless dry_run is set, since routed text must
+    reach Convex (the source of truth) before the capture is marked done.
+    Returns (routed, left) counts; left stubs stay in inbox/new/.
+    """
+    if scheduler is None and not dry_run:
+        raise ValueError("route_stubs needs a ConvexScheduler unless dry_run is set")
+
+    index = None  # Built on first use; attachment-only runs never need it
+    sync_state = load_sync_state() if not dry_run else None
+    routed = 0
+    left = 0
+
+    for stub_path in stub_paths:
+        with open(stub_path, "r", encoding="utf-8") as f:
+            stub = frontmatter.load(f)
+
+        # Non-text captures need the model to look at the attachment
+        if stub.get("content_type", "text") != "text" or stub.get("assets"):
+            left += 1
+            print(f"  [?] {stub_path.name}: has attachment, leaving for AI")
+            continue
+
+        # Only captures the AI cron hasn't touched yet are ours to route
+        convex_id = stub.get("convex_id")
+        if not convex_id or stub.get("status", "pending") != "pending":
+            left += 1
+            print(f"  [?] {stub_path.name}: not pending in Convex, leaving as-is")
+            continue
+
+        if index is None:
+            index = build_note_index()
+        note, score = pick_route(stub.content, index)
+        if note is None:
+            left += 1
+            print(f"  [?] {stub_path.name}: ambiguous (best {score:.2f}), leaving for AI")
+            continue
+
+        if dry_run:
+            routed += 1
+            print(f"  [>] {stub_path.name} -> {note['path']} ({note['jdId']}, {score:.2f})")
+            continue
+
+        try:
+            claimed, status = claim_capture(scheduler, convex_id)
+        except Exception as e:
+            left += 1
+            print(f"  [!] {stub_path.name}: could not claim capture ({e}), leaving for AI")
+            continue
+        if not claimed:
+            left += 1
+            print(f"  [?] {stub_path.name}: already {status or 'gone'} in Convex, leaving as-is")
+            continue
+
+        original = append_to_note(note["path"], stub.content, stub.get("id", stub_path.stem), stub.get("captured_at"))
+        try:
+            result = upload_routed_note(scheduler, note["path"], sync_state)
+        except Exception as e:
+            restore_note(note["path"], original)
+            left += 1
+            print(f"  [!] {stub_path.name}: failed to update {note['path']} in Convex ({e}), leaving for AI")
+            try:
+                release_capture(scheduler, convex_id)
+            except Exception as release_error:
+                print(f"      Warning: capture is stuck in 'processing' ({release_error})")
+            continue
+
+        try:
+            scheduler.mutation("captures:markDone", {"id": convex_id})
+        except Exception as e:
+            # The note already has the text and the capture stays claimed
+            # (processing), so neither the cron nor a rerun will add it again
+            left += 1
+            print(f"  [!] {stub_path.name}: appended to {note['path']} but markDone failed: {e}")
+            continue
+
+        move_to_processed(stub_path, note, score)
+        routed += 1
+        print(f"  [>] {stub_path.name} -> {note['path']} ({note['jdId']}, {score:.2f}) v{result['version']}")
+
+    if sync_state is not None:
+        save_sync_state(sync_state)
+
+    return routed, left
+
+
+def main():
+    """Main routing function."""
+    dry_run = "--dry-run" in sys.argv
+
+    stubs = sorted(INBOX_NEW.glob("*.md"))
+    if not stubs:
+        print("No captures in inbox/new/ to route.")
+        return
+
+    print(f"Routing {len(stubs)} capture(s) against local notes...")
+    if dry_run:
+        print("Dry run: no files will be changed")
+
+    if dry_run:
+        routed, left = route_stubs(stubs, dry_run=True)
+    else:
+        if not CONVEX_URL:
+            print("Error: CONVEX_URL or NEXT_PUBLIC_CONVEX_URL environment variable not set")
+            print("Please set it in your .env file or environment")
+            sys.exit(1)
+        with httpx.Client(timeout=30.0) as client:
+            routed, left = route_stubs(stubs, ConvexScheduler(client, CONVEX_URL))
+
+    print()
+    print(f"Done!")
+    print(f"  Routed locally: {routed}")
+    print(f"  Left in inbox/new/: {left}")
+
+
+if __name__ == "__main__":
+    main()
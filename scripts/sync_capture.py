@@ -5,20 +5,39 @@ sync_capture.py - Pull captures from Convex to local inbox
 This script:
 1. Connects to Convex via HTTP API
 2. Fetches unsynced captures from capture_queue
-3. For each capture:
-   - Generates an ID: cap_XXXX
-   - Writes a stub to inbox/new/{timestamp}-{id}.md
-   - Downloads any attached files to inbox/assets/
-4. Marks captures as synced in Convex
+3. Runs each capture through a staged pipeline with bounded queues:
+   fetch -> download -> write stub -> mark synced
+   - fetch assigns an ID: cap_XXXX
+   - download saves any attached file to inbox/assets/
+   - write stub creates inbox/new/{timestamp}-{id}.md
+   - mark synced calls captures:markSynced in small batches
+4. Routes obvious captures to existing notes locally (see route_inbox.py)
+
+Every stage transition is appended to _capture_journal.jsonl before moving
+on, so an interrupted run resumes where it stopped: captures keep their
+assigned IDs, written stubs are not rewritten, and only captures not yet
+acknowledged by Convex are marked synced again.
+
+Usage:
+    python sync_capture.py              # Sync and route captures
+    python sync_capture.py --no-route   # Sync only; leave all stubs for AI
+    python sync_capture.py --profile    # Also --trace-memory, --slow-log,
+                                        # --slow-threshold=SECS (see sync_profiling.py)
 """
 
 import os
 import sys
 import json
+import time
+import queue
+import threading
 import httpx
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
+from convex_scheduler import ConvexScheduler
+from route_inbox import route_stubs
+from sync_profiling import profiling_session, timed
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +48,18 @@ REPO_ROOT = Path(__file__).parent.parent
 INBOX_NEW = REPO_ROOT / "second-brain" / "inbox" / "new"
 INBOX_ASSETS = REPO_ROOT / "second-brain" / "inbox" / "assets"
 STATE_FILE = REPO_ROOT / "second-brain" / "_state.json"
+JOURNAL_FILE = REPO_ROOT / "second-brain" / "_capture_journal.jsonl"
+
+# Pipeline tuning
+QUEUE_SIZE = 16          # Max captures waiting between two stages
+DOWNLOAD_WORKERS = 4     # Parallel attachment downloads
+MARK_BATCH_SIZE = 10     # Captures per captures:markSynced call
+MARK_FLUSH_SECONDS = 2.0 # Flush a partial batch after this long idle
+
+# Journal stages, in order
+ASSIGNED = "assigned"
+WRITTEN = "written"
+SYNCED = "synced"
 
 
 def get_next_capture_id() -> str:
@@ -47,48 +78,102 @@ def load_state() -> dict:
 
 
 def save_state(state: dict) -> None:
-    """Save state to _state.json."""
-    with open(STATE_FILE, "w") as f:
+    """Save state to _state.json (atomically, so a crash never truncates it)."""
+    tmp_file = STATE_FILE.with_suffix(".json.tmp")
+    with open(tmp_file, "w") as f:
         json.dump(state, f, indent=2)
+    os.replace(tmp_file, STATE_FILE)
+
+
+class CaptureJournal:
+    """
+    Append-only record of each capture's progress through the pipeline.
+
+    Each line is {"convex_id", "capture_id", "stage"}; the last line for a
+    capture wins. Lines are fsynced so a record survives a crash right after
+    the stage it describes.
+    """
+
+    def __init__(self, path: Path = JOURNAL_FILE):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        if path.exists():
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        continue
+                    self.entries[record["convex_id"]] = record
+
+        self._file = open(path, "a")
+
+    def get(self, convex_id: str) -> dict | None:
+        """Latest record for a capture, if any."""
+        return self.entries.get(convex_id)
+
+    def record(self, convex_id: str, capture_id: str, stage: str) -> None:
+        """Durably record that a capture reached a stage."""
+        entry = {"convex_id": convex_id, "capture_id": capture_id, "stage": stage}
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.entries[convex_id] = entry
 
+    def highest_capture_num(self) -> int:
+        """Largest cap_XXXX number assigned in the journal (0 if none)."""
+        nums = [int(e["capture_id"].split("_")[1]) for e in self.entries.values()]
+        return max(nums, default=0)
 
-def fetch_unsynced_captures(client: httpx.Client) -> list[dict]:
+    def compact(self) -> None:
+        """Drop captures Convex has acknowledged; keep anything in progress."""
+        with self._lock:
+            self._file.close()
+            pending = [e for e in self.entries.values() if e["stage"] != SYNCED]
+            tmp_file = self.path.with_suffix(".jsonl.tmp")
+            with open(tmp_file, "w") as f:
+                for entry in pending:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_file, self.path)
+            self.entries = {e["convex_id"]: e for e in pending}
+            self._file = open(self.path, "a")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def fetch_unsynced_captures(scheduler: ConvexScheduler) -> list[dict]:
     """Fetch unsynced captures from Convex."""
-    response = client.post(
-        f"{CONVEX_URL}/api/query",
-        json={
-            "path": "captures:getUnsynced",
-            "args": {},
-        },
-    )
-    response.raise_for_status()
-    result = response.json()
-    
-    if "value" in result:
-        return result["value"]
-    return []
+    return scheduler.query("captures:getUnsynced") or []
 
 
-def mark_captures_synced(client: httpx.Client, ids: list[str]) -> None:
+def mark_captures_synced(scheduler: ConvexScheduler, ids: list[str]) -> None:
     """Mark captures as synced in Convex."""
     if not ids:
         return
     
-    response = client.post(
-        f"{CONVEX_URL}/api/mutation",
-        json={
-            "path": "captures:markSynced",
-            "args": {"ids": ids},
-        },
-    )
-    response.raise_for_status()
+    scheduler.mutation("captures:markSynced", {"ids": ids})
+
+
+def asset_filename(capture: dict, capture_id: str) -> str:
+    """Local filename for a capture's attachment (inbox/assets/cap_XXXX.ext)."""
+    file_ext = ".jpg"  # Default extension
+    if "." in capture["fileUrl"].split("/")[-1]:
+        file_ext = "." + capture["fileUrl"].split(".")[-1].split("?")[0]
+    return f"{capture_id}{file_ext}"
 
 
 def download_file(client: httpx.Client, url: str, filename: str) -> Path:
     """Download a file from URL to inbox/assets/."""
     INBOX_ASSETS.mkdir(parents=True, exist_ok=True)
     
-    response = client.get(url)
+    with timed("download", filename) as info:
+        response = client.get(url)
+        info["size"] = len(response.content)
     response.raise_for_status()
     
     filepath = INBOX_ASSETS / filename
@@ -98,17 +183,25 @@ def download_file(client: httpx.Client, url: str, filename: str) -> Path:
     return filepath
 
 
+def stub_path_for(capture: dict, capture_id: str) -> Path:
+    """Path of a capture's stub in inbox/new/ (deterministic, so reruns overwrite)."""
+    created_at = datetime.fromtimestamp(capture["createdAt"] / 1000)
+    timestamp_str = created_at.strftime("%Y-%m-%dT%H-%M-%SZ")
+    return INBOX_NEW / f"{timestamp_str}-{capture_id}.md"
+
+
 def create_capture_stub(capture: dict, capture_id: str) -> Path:
     """Create a markdown stub for a capture in inbox/new/."""
     INBOX_NEW.mkdir(parents=True, exist_ok=True)
     
     # Parse timestamp
     created_at = datetime.fromtimestamp(capture["createdAt"] / 1000)
-    timestamp_str = created_at.strftime("%Y-%m-%dT%H-%M-%SZ")
     
     # Build frontmatter
     frontmatter = {
         "id": capture_id,
+        "convex_id": capture["_id"],
+        "status": capture.get("status", "pending"),
         "captured_at": created_at.isoformat(),
         "source": capture.get("source", "unknown"),
         "content_type": capture.get("contentType", "text"),
@@ -116,13 +209,7 @@ def create_capture_stub(capture: dict, capture_id: str) -> Path:
     
     # Handle file URL if present
     if capture.get("fileUrl"):
-        # Extract filename from URL or generate one
-        file_ext = ".jpg"  # Default extension
-        if "." in capture["fileUrl"].split("/")[-1]:
-            file_ext = "." + capture["fileUrl"].split(".")[-1].split("?")[0]
-        
-        asset_filename = f"{capture_id}{file_ext}"
-        frontmatter["assets"] = [f"../assets/{asset_filename}"]
+        frontmatter["assets"] = [f"../assets/{asset_filename(capture, capture_id)}"]
     
     # Build markdown content
     text = capture.get("text", "")
@@ -130,8 +217,7 @@ def create_capture_stub(capture: dict, capture_id: str) -> Path:
         text = f"[Capture from {capture.get('source', 'unknown')}]"
     
     # Create the stub file
-    filename = f"{timestamp_str}-{capture_id}.md"
-    filepath = INBOX_NEW / filename
+    filepath = stub_path_for(capture, capture_id)
     
     # Write the file
     frontmatter_yaml = "\n".join(f"{k}: {json.dumps(v) if isinstance(v, list) else v}" 
@@ -144,14 +230,263 @@ def create_capture_stub(capture: dict, capture_id: str) -> Path:
 {text}
 """
     
-    with open(filepath, "w") as f:
-        f.write(content)
+    with timed("write", filepath.name, len(content)):
+        with open(filepath, "w") as f:
+            f.write(content)
     
     return filepath
 
 
+# Marks the end of a stage's output
+DONE = object()
+
+# How often blocked stages wake up to check for a stop request
+POLL_SECONDS = 0.2
+
+
+class PipelineError(RuntimeError):
+    """A pipeline stage failed unexpectedly; progress so far is journaled."""
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage when another stage has failed or the run was interrupted."""
+
+
+class PipelineControl:
+    """
+    Shared stop flag for the pipeline threads.
+
+    Every blocking put/get goes through here and gives up once stop is set,
+    so one failed stage (or Ctrl-C) shuts the whole pipeline down instead
+    of leaving the others blocked on full or empty queues.
+    """
+
+    def __init__(self):
+        self.stop = threading.Event()
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def fail(self, stage: str, error: BaseException) -> None:
+        with self._lock:
+            self.failures.append((stage, error))
+        self.stop.set()
+
+    def put(self, q: queue.Queue, item) -> None:
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+        raise PipelineStopped()
+
+    def get(self, q: queue.Queue, timeout: float = None):
+        """Next item; raises queue.Empty after timeout (if given)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.stop.is_set():
+            wait = POLL_SECONDS
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise queue.Empty()
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                pass
+        raise PipelineStopped()
+
+    def run(self, stage: str, target, *args) -> threading.Thread:
+        """Start a stage in a daemon thread that reports failures here."""
+        def body():
+            try:
+                target(self, *args)
+            except PipelineStopped:
+                pass
+            except BaseException as e:
+                print(f"  [!] {stage} stage failed: {e!r}")
+                self.fail(stage, e)
+
+        thread = threading.Thread(target=body, name=f"capture-{stage}", daemon=True)
+        thread.start()
+        return thread
+
+
+def fetch_stage(ctl: PipelineControl, captures: list[dict], journal: CaptureJournal, state: dict,
+                downloads: queue.Queue, to_mark: queue.Queue) -> None:
+    """Assign capture IDs (reusing journaled ones) and feed the pipeline."""
+    try:
+        for capture in captures:
+            entry = journal.get(capture["_id"])
+            
+            if entry and entry["stage"] == SYNCED:
+                # Acknowledged before a crash; Convex just hasn't caught up
+                continue
+            
+            if entry and entry["stage"] == WRITTEN:
+                capture_id = entry["capture_id"]
+                print(f"Resuming {capture_id} (stub already written)")
+                ctl.put(to_mark, (capture, capture_id, stub_path_for(capture, capture_id)))
+                continue
+            
+            if entry:
+                capture_id = entry["capture_id"]
+                print(f"Resuming {capture_id}...")
+            else:
+                capture_id = f"cap_{state['next_capture_num']:04d}"
+                state["next_capture_num"] += 1
+                journal.record(capture["_id"], capture_id, ASSIGNED)
+                save_state(state)
+                print(f"Processing {capture_id}...")
+            
+            ctl.put(downloads, (capture, capture_id))
+    finally:
+        # Always release the downloaders, or the pipeline never drains
+        # (ctl.put gives up by itself if the pipeline is stopping)
+        for _ in range(DOWNLOAD_WORKERS):
+            ctl.put(downloads, DONE)
+
+
+def download_stage(ctl: PipelineControl, client: httpx.Client, downloads: queue.Queue, writes: queue.Queue) -> None:
+    """Download attachments; failures are warnings, the stub is still written."""
+    try:
+        while True:
+            item = ctl.get(downloads)
+            if item is DONE:
+                return
+            
+            capture, capture_id = item
+            if capture.get("fileUrl"):
+                try:
+                    filename = asset_filename(capture, capture_id)
+                    download_file(client, capture["fileUrl"], filename)
+                    print(f"  Downloaded asset: {filename}")
+                except Exception as e:
+                    print(f"  Warning: Failed to download file for {capture_id}: {e}")
+            
+            ctl.put(writes, (capture, capture_id))
+    finally:
+        ctl.put(writes, DONE)
+
+
+def write_stage(ctl: PipelineControl, journal: CaptureJournal, writes: queue.Queue, to_mark: queue.Queue, stats: dict) -> None:
+    """Write stubs and journal them; runs until every downloader is done."""
+    try:
+        remaining = DOWNLOAD_WORKERS
+        while remaining:
+            item = ctl.get(writes)
+            if item is DONE:
+                remaining -= 1
+                continue
+            
+            capture, capture_id = item
+            try:
+                stub_path = create_capture_stub(capture, capture_id)
+            except Exception as e:
+                stats["write_errors"] += 1
+                print(f"  [!] Error writing stub for {capture_id}: {e}")
+                continue
+            
+            # A journal failure is fatal: without it, progress can't be resumed
+            journal.record(capture["_id"], capture_id, WRITTEN)
+            print(f"  Created stub: {stub_path.name}")
+            ctl.put(to_mark, (capture, capture_id, stub_path))
+    finally:
+        ctl.put(to_mark, DONE)
+
+
+def mark_stage(ctl: PipelineControl, scheduler: ConvexScheduler, journal: CaptureJournal, to_mark: queue.Queue, stats: dict) -> None:
+    """Mark captures synced in small batches as they arrive."""
+    batch = []
+    
+    def flush():
+        if not batch:
+            return
+        try:
+            mark_captures_synced(scheduler, [capture["_id"] for capture, _, _ in batch])
+        except Exception as e:
+            # Left as "written" in the journal; the next run retries them
+            stats["mark_errors"] += len(batch)
+            print(f"  [!] Error marking {len(batch)} capture(s) synced: {e}")
+        else:
+            for capture, capture_id, stub_path in batch:
+                journal.record(capture["_id"], capture_id, SYNCED)
+                stats["synced"] += 1
+                stats["stub_paths"].append(stub_path)
+            print(f"  Marked {len(batch)} capture(s) synced")
+        batch.clear()
+    
+    while True:
+        try:
+            item = ctl.get(to_mark, timeout=MARK_FLUSH_SECONDS)
+        except queue.Empty:
+            flush()
+            continue
+        except PipelineStopped:
+            # Another stage failed: still acknowledge the stubs already written
+            flush()
+            raise
+        
+        if item is DONE:
+            flush()
+            return
+        
+        batch.append(item)
+        if len(batch) >= MARK_BATCH_SIZE:
+            flush()
+
+
+def run_pipeline(client: httpx.Client, scheduler: ConvexScheduler, captures: list[dict], journal: CaptureJournal) -> dict:
+    """
+    Run captures through fetch -> download -> write stub -> mark synced.
+    Returns stats with synced/errors counts and the stub paths written.
+    Raises PipelineError if a stage fails unexpectedly, and re-raises
+    KeyboardInterrupt after stopping every stage.
+    """
+    state = load_state()
+    # The journal is written before _state.json, so trust whichever is ahead
+    state["next_capture_num"] = max(state.get("next_capture_num", 1), journal.highest_capture_num() + 1)
+    
+    downloads = queue.Queue(maxsize=QUEUE_SIZE)
+    writes = queue.Queue(maxsize=QUEUE_SIZE)
+    to_mark = queue.Queue(maxsize=QUEUE_SIZE)
+    # Each counter is only written by one stage thread, so no lock is needed
+    stats = {"synced": 0, "write_errors": 0, "mark_errors": 0, "stub_paths": []}
+    ctl = PipelineControl()
+    
+    threads = [
+        ctl.run("fetch", fetch_stage, captures, journal, state, downloads, to_mark),
+        ctl.run("write", write_stage, journal, writes, to_mark, stats),
+        ctl.run("mark", mark_stage, scheduler, journal, to_mark, stats),
+    ]
+    threads += [
+        ctl.run("download", download_stage, client, downloads, writes)
+        for _ in range(DOWNLOAD_WORKERS)
+    ]
+    
+    try:
+        # Join with a timeout so Ctrl-C reaches this thread
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(POLL_SECONDS)
+    except KeyboardInterrupt:
+        print("Interrupted; stopping pipeline (progress is journaled)...")
+        ctl.stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+    
+    if ctl.failures:
+        stage, error = ctl.failures[0]
+        raise PipelineError(f"{stage} stage failed: {error!r}") from error
+    
+    stats["errors"] = stats["write_errors"] + stats["mark_errors"]
+    return stats
+
+
 def main():
     """Main sync function."""
+    route = "--no-route" not in sys.argv
+    
     if not CONVEX_URL:
         print("Error: CONVEX_URL or NEXT_PUBLIC_CONVEX_URL environment variable not set")
         print("Please set it in your .env file or environment")
@@ -160,9 +495,11 @@ def main():
     print(f"Connecting to Convex: {CONVEX_URL}")
     
     with httpx.Client(timeout=30.0) as client:
+        scheduler = ConvexScheduler(client, CONVEX_URL)
+        
         # Fetch unsynced captures
         print("Fetching unsynced captures...")
-        captures = fetch_unsynced_captures(client)
+        captures = fetch_unsynced_captures(scheduler)
         
         if not captures:
             print("No new captures to sync.")
@@ -170,50 +507,33 @@ def main():
         
         print(f"Found {len(captures)} capture(s) to sync.")
         
-        # Load state
-        state = load_state()
-        synced_ids = []
+        journal = CaptureJournal()
+        try:
+            stats = run_pipeline(client, scheduler, captures, journal)
+            if not stats["errors"]:
+                journal.compact()
+        except PipelineError as e:
+            print(f"Error: {e}")
+            print("Rerun to resume; progress up to the failure is journaled.")
+            sys.exit(1)
+        finally:
+            journal.close()
         
-        for capture in captures:
-            # Generate capture ID
-            capture_id = f"cap_{state['next_capture_num']:04d}"
-            state["next_capture_num"] += 1
-            
-            print(f"Processing {capture_id}...")
-            
-            # Download file if present
-            if capture.get("fileUrl"):
-                try:
-                    file_ext = ".jpg"
-                    if "." in capture["fileUrl"].split("/")[-1]:
-                        file_ext = "." + capture["fileUrl"].split(".")[-1].split("?")[0]
-                    
-                    asset_filename = f"{capture_id}{file_ext}"
-                    download_file(client, capture["fileUrl"], asset_filename)
-                    print(f"  Downloaded asset: {asset_filename}")
-                except Exception as e:
-                    print(f"  Warning: Failed to download file: {e}")
-            
-            # Create stub
-            stub_path = create_capture_stub(capture, capture_id)
-            print(f"  Created stub: {stub_path.name}")
-            
-            # Track for syncing
-            synced_ids.append(capture["_id"])
+        # Route obvious captures without waiting for AI processing
+        routed = 0
+        stub_paths = [p for p in stats["stub_paths"] if p.exists()]
+        if route and stub_paths:
+            print("Routing captures against local notes...")
+            routed, _ = route_stubs(sorted(stub_paths), scheduler)
         
-        # Save state
-        save_state(state)
-        
-        # Mark as synced in Convex
-        print("Marking captures as synced...")
-        mark_captures_synced(client, synced_ids)
-        
-        print(f"Done! Synced {len(synced_ids)} capture(s).")
+        print(f"Done! Synced {stats['synced']} capture(s).")
+        if stats["errors"]:
+            print(f"  Errors: {stats['errors']} (rerun to retry; progress is journaled)")
+        if routed:
+            print(f"Routed {routed} capture(s) locally (see inbox/processed/).")
         print(f"Check inbox/new/ for new items to process.")
 
 
 if __name__ == "__main__":
-    main()
-
-
-
+    with profiling_session("sync_capture"):
+        main()
@@ -15,6 +15,8 @@ This script syncs DOWN to local for Obsidian access.
 Usage:
     python sync_down.py              # Sync all notes
     python sync_down.py --force      # Force overwrite all local files
+    python sync_down.py --profile    # Also --trace-memory, --slow-log,
+                                     # --slow-threshold=SECS (see sync_profiling.py)
 """
 
 import os
@@ -24,6 +26,10 @@ import httpx
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
+from convex_scheduler import ConvexScheduler
+from vault_scanner import scan_notes
+from sync_profiling import profiling_session, timed
+from note_delta import save_base, remove_base
 
 # Load environment variables
 load_dotenv()
@@ -64,21 +70,9 @@ def save_sync_state(state: dict) -> None:
         json.dump(state, f, indent=2)
 
 
-def fetch_all_notes(client: httpx.Client) -> list[dict]:
+def fetch_all_notes(scheduler: ConvexScheduler) -> list[dict]:
     """Fetch all notes from Convex with version info."""
-    response = client.post(
-        f"{CONVEX_URL}/api/query",
-        json={
-            "path": "notes:getForSync",
-            "args": {},
-        },
-    )
-    response.raise_for_status()
-    result = response.json()
-    
-    if "value" in result:
-        return result["value"]
-    return []
+    return scheduler.query("notes:getForSync") or []
 
 
 def generate_frontmatter(note: dict) -> str:
@@ -103,19 +97,38 @@ def generate_frontmatter(note: dict) -> str:
     return "\n".join(lines)
 
 
-def write_note_file(note: dict, force: bool = False) -> tuple[str, bool]:
+def find_local_paths() -> set[str]:
+    """
+    Paths (relative to second-brain) of all local notes, via the cached scanner.
+    Scans every top-level folder except inbox, since notes created in the app
+    can live in category folders (e.g. 41-movies) outside the JD area folders.
+    """
+    folders = [
+        entry.name for entry in os.scandir(SECOND_BRAIN)
+        if entry.is_dir() and not entry.name.startswith(".") and entry.name != "inbox"
+    ]
+    return {
+        entry.path.relative_to(SECOND_BRAIN).as_posix()
+        for entry in scan_notes(folders)
+    }
+
+
+def write_note_file(note: dict, force: bool = False, local_paths: set[str] = None) -> tuple[str, bool]:
     """
     Write a note to a local markdown file.
     Returns (action, success) where action is 'created', 'updated', or 'skipped'.
+    local_paths, if given, is used instead of stat-ing the file to see if it exists.
     """
     path = note["path"]
     filepath = SECOND_BRAIN / path
+    exists = path in local_paths if local_paths is not None else filepath.exists()
     
     # Ensure the directory exists
-    filepath.parent.mkdir(parents=True, exist_ok=True)
+    if not exists:
+        filepath.parent.mkdir(parents=True, exist_ok=True)
     
     # Check if file exists and compare versions
-    if filepath.exists() and not force:
+    if exists and not force:
         # For now, just overwrite - we'll handle conflicts in sync_notes.py
         pass
     
@@ -132,26 +145,29 @@ def write_note_file(note: dict, force: bool = False) -> tuple[str, bool]:
     
     full_content = f"{frontmatter}\n\n{content}"
     
-    action = "updated" if filepath.exists() else "created"
+    action = "updated" if exists else "created"
     
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(full_content)
+        with timed("write", path, len(full_content)):
+            with open(filepath, "w", encoding="utf-8") as f:
+                f.write(full_content)
         return action, True
     except Exception as e:
         print(f"  [!] Error writing {path}: {e}")
         return "error", False
 
 
-def remove_orphaned_files(remote_paths: set[str], state: dict) -> int:
+def remove_orphaned_files(remote_paths: set[str], state: dict, local_paths: set[str] = None) -> int:
     """Remove local files that no longer exist in Convex."""
     removed = 0
     synced_paths = set(state.get("notes", {}).keys())
     
     orphaned = synced_paths - remote_paths
-    for path in orphaned:
+    for path in sorted(orphaned):
+        remove_base(path)
         filepath = SECOND_BRAIN / path
-        if filepath.exists():
+        exists = path in local_paths if local_paths is not None else filepath.exists()
+        if exists:
             try:
                 filepath.unlink()
                 print(f"  [-] Removed orphaned: {path}")
@@ -182,9 +198,11 @@ def main():
         print(f"Last sync: {last_sync}")
     
     with httpx.Client(timeout=30.0) as client:
+        scheduler = ConvexScheduler(client, CONVEX_URL)
+        
         # Fetch all notes from Convex
         print("Fetching notes from Convex...")
-        notes = fetch_all_notes(client)
+        notes = fetch_all_notes(scheduler)
         
         if not notes:
             print("No notes found in Convex.")
@@ -198,6 +216,7 @@ def main():
         errors = 0
         
         remote_paths = set()
+        local_paths = find_local_paths()
         new_state = {"notes": {}, "last_sync": None}
         
         for note in notes:
@@ -215,9 +234,11 @@ def main():
                 continue
             
             # Write the file
-            action, success = write_note_file(note, force)
+            action, success = write_note_file(note, force, local_paths)
             
             if success:
+                # Remember what Convex holds so sync_notes.py can send deltas
+                save_base(path, note["content"])
                 new_state["notes"][path] = {
                     "version": version,
                     "synced_at": datetime.utcnow().isoformat(),
@@ -236,7 +257,7 @@ def main():
                     new_state["notes"][path] = state["notes"][path]
         
         # Remove orphaned local files
-        removed = remove_orphaned_files(remote_paths, state)
+        removed = remove_orphaned_files(remote_paths, state, local_paths)
         
         # Save new sync state
         save_sync_state(new_state)
@@ -252,5 +273,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profiling_session("sync_down"):
+        main()
 
@@ -6,7 +6,8 @@ This script:
 1. Scans JD folders for .md files
 2. Parses each file for frontmatter (jdId, title, version)
 3. Checks for conflicts using version tracking
-4. Upserts to Convex notes table with conflict detection
+4. Upserts to Convex notes table with conflict detection, sending a line
+   delta against the last-synced copy for large edits (see note_delta.py)
 5. Creates .conflict backup files when conflicts occur
 
 For the app-first architecture, Convex is the source of truth.
@@ -16,6 +17,11 @@ Usage:
     python sync_notes.py              # Sync all notes
     python sync_notes.py file1.md ... # Sync specific files
     python sync_notes.py --force      # Force overwrite (ignores conflicts)
+    python sync_notes.py --profile    # Also --trace-memory, --slow-log,
+                                      # --slow-threshold=SECS (see sync_profiling.py)
+
+Notes are uploaded concurrently; the number of in-flight mutations adapts
+to Convex latency and rate limiting (see convex_scheduler.py).
 """
 
 import os
@@ -26,7 +32,12 @@ import httpx
 import shutil
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from convex_scheduler import ConvexScheduler, MAX_LIMIT
+from vault_scanner import scan_notes
+from sync_profiling import profiling_session, timed
+from note_delta import load_base, save_base, make_delta, checksum
 
 try:
     import frontmatter
@@ -44,20 +55,6 @@ REPO_ROOT = Path(__file__).parent.parent
 SECOND_BRAIN = REPO_ROOT / "second-brain"
 SYNC_STATE_FILE = SECOND_BRAIN / "_sync_state.json"
 
-# JD folders to scan (exclude inbox)
-JD_FOLDERS = [
-    "00-index",
-    "10-reference",
-    "20-projects",
-    "30-people",
-    "40-media",
-    "50-events",
-    "60-ideas",
-    "70-home",
-    "80-personal",
-    "90-archive",
-]
-
 
 def load_sync_state() -> dict:
     """Load the sync state from _sync_state.json."""
@@ -132,16 +129,19 @@ def create_conflict_backup(filepath: Path) -> Path:
     return conflict_path
 
 
-def sync_note(client: httpx.Client, filepath: Path, force: bool = False, state: dict = None) -> dict:
+def sync_note(scheduler: ConvexScheduler, filepath: Path, force: bool = False, state: dict = None) -> dict:
     """Sync a single note to Convex with conflict detection."""
+    relative_path = get_relative_path(filepath)
+    
     # Read and parse the file
     with open(filepath, "r", encoding="utf-8") as f:
-        content = frontmatter.load(f)
+        raw = f.read()
+    with timed("parse", relative_path, len(raw)):
+        content = frontmatter.loads(raw)
     
     # Extract metadata
     jd_id = extract_jd_id(filepath, content)
     title = extract_title(filepath, content)
-    relative_path = get_relative_path(filepath)
     local_version = extract_version(content)
     
     # Get the expected version from sync state
@@ -165,19 +165,35 @@ def sync_note(client: httpx.Client, filepath: Path, force: bool = False, state:
     if expected_version is not None and not force:
         upsert_args["expectedVersion"] = expected_version
     
-    # Call Convex upsert
-    response = client.post(
-        f"{CONVEX_URL}/api/mutation",
-        json={
-            "path": "notes:upsert",
-            "args": upsert_args,
-        },
-    )
-    response.raise_for_status()
-    result = response.json()
-    value = result.get("value", {})
+    # For large edits, send a delta against what Convex held at last sync
+    delta_args = None
+    base = load_base(relative_path)
+    delta = make_delta(base, full_content) if base is not None else None
+    if delta:
+        delta_args = {k: v for k, v in upsert_args.items() if k != "content"}
+        delta_args.update(
+            delta=delta,
+            baseChecksum=checksum(base),
+            checksum=checksum(full_content),
+        )
+    
+    # Call Convex upsert (the scheduler times just the round-trip for the slow log)
+    value = None
+    if delta_args:
+        value = scheduler.mutation(
+            "notes:upsert", delta_args, trace=("upload", relative_path, len(delta))
+        ) or {}
+        if value.get("action") in ("baseMismatch", "checksumMismatch"):
+            # Our base is stale; fall back to the full note
+            value = None
+    if value is None:
+        value = scheduler.mutation(
+            "notes:upsert", upsert_args, trace=("upload", relative_path, len(full_content))
+        ) or {}
     
     action = value.get("action", "unknown")
+    if action in ("created", "updated"):
+        save_base(relative_path, full_content)
     new_version = value.get("version", local_version + 1)
     
     return {
@@ -192,13 +208,8 @@ def sync_note(client: httpx.Client, filepath: Path, force: bool = False, state:
 
 
 def find_all_notes() -> list[Path]:
-    """Find all markdown files in JD folders."""
-    notes = []
-    for folder in JD_FOLDERS:
-        folder_path = SECOND_BRAIN / folder
-        if folder_path.exists():
-            notes.extend(folder_path.glob("**/*.md"))
-    return sorted(notes)
+    """Find all markdown files in JD folders (sorted, via the cached scanner)."""
+    return [entry.path for entry in scan_notes()]
 
 
 def main():
@@ -237,7 +248,8 @@ def main():
     if force:
         print("Force mode: ignoring conflicts")
     
-    with httpx.Client(timeout=30.0) as client:
+    with httpx.Client(timeout=30.0, limits=httpx.Limits(max_connections=int(MAX_LIMIT))) as client:
+        scheduler = ConvexScheduler(client, CONVEX_URL)
         created = 0
         updated = 0
         conflicts = 0
@@ -246,46 +258,53 @@ def main():
         new_state = state.copy()
         new_state["notes"] = state.get("notes", {}).copy()
         
-        for filepath in files:
-            try:
-                result = sync_note(client, filepath, force, state)
-                action = result["action"]
-                
-                if action == "conflict":
-                    conflicts += 1
-                    current_v = result.get("currentVersion", "?")
-                    expected_v = result.get("expectedVersion", "?")
-                    
-                    # Create a backup of the local file
-                    backup_path = create_conflict_backup(filepath)
-                    
-                    print(f"  [!] CONFLICT: {result['path']}")
-                    print(f"      Local expected v{expected_v}, remote is v{current_v}")
-                    print(f"      Local saved to: {backup_path.name}")
-                    print(f"      Run sync_down.py to get remote version")
-                    
-                elif action == "created":
-                    created += 1
-                    new_state["notes"][result["path"]] = {
-                        "version": result["version"],
-                        "synced_at": datetime.utcnow().isoformat(),
-                    }
-                    print(f"  [+] {result['path']} ({result['jdId']}) v{result['version']}")
-                    
-                elif action == "updated":
-                    updated += 1
-                    new_state["notes"][result["path"]] = {
-                        "version": result["version"],
-                        "synced_at": datetime.utcnow().isoformat(),
-                    }
-                    print(f"  [~] {result['path']} ({result['jdId']}) v{result['version']}")
-                    
-                else:
-                    print(f"  [?] {result['path']} ({action})")
+        # Submit every note up front; the scheduler decides how many run at once
+        with ThreadPoolExecutor(max_workers=int(MAX_LIMIT)) as executor:
+            futures = {
+                executor.submit(sync_note, scheduler, filepath, force, state): filepath
+                for filepath in files
+            }
+            for future in as_completed(futures):
+                filepath = futures[future]
+                try:
+                    result = future.result()
+                    action = result["action"]
                     
-            except Exception as e:
-                errors += 1
-                print(f"  [!] Error syncing {filepath}: {e}")
+                    if action == "conflict":
+                        conflicts += 1
+                        current_v = result.get("currentVersion", "?")
+                        expected_v = result.get("expectedVersion", "?")
+                        
+                        # Create a backup of the local file
+                        backup_path = create_conflict_backup(filepath)
+                        
+                        print(f"  [!] CONFLICT: {result['path']}")
+                        print(f"      Local expected v{expected_v}, remote is v{current_v}")
+                        print(f"      Local saved to: {backup_path.name}")
+                        print(f"      Run sync_down.py to get remote version")
+                        
+                    elif action == "created":
+                        created += 1
+                        new_state["notes"][result["path"]] = {
+                            "version": result["version"],
+                            "synced_at": datetime.utcnow().isoformat(),
+                        }
+                        print(f"  [+] {result['path']} ({result['jdId']}) v{result['version']}")
+                        
+                    elif action == "updated":
+                        updated += 1
+                        new_state["notes"][result["path"]] = {
+                            "version": result["version"],
+                            "synced_at": datetime.utcnow().isoformat(),
+                        }
+                        print(f"  [~] {result['path']} ({result['jdId']}) v{result['version']}")
+                        
+                    else:
+                        print(f"  [?] {result['path']} ({action})")
+                        
+                except Exception as e:
+                    errors += 1
+                    print(f"  [!] Error syncing {filepath}: {e}")
         
         # Save updated sync state
         save_sync_state(new_state)
@@ -308,4 +327,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profiling_session("sync_notes"):
+        main()
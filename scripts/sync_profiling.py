@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+sync_profiling.py - Profiling hooks shared by the sync scripts
+
+This module:
+1. Reads profiling flags from the command line
+2. Runs the script under cProfile (--profile)
+3. Tracks allocations with tracemalloc (--trace-memory)
+4. Logs individual notes/captures whose parse, upload, download or write
+   took longer than a threshold, with their size (--slow-log, implied by
+   either flag above)
+5. Writes reports to profiles/{script}-{timestamp}.*
+
+Flags:
+    --profile               Write a cProfile dump (.prof) and summary (.txt)
+    --trace-memory          Write the top tracemalloc allocations (.mem.txt)
+    --slow-log              Write only the slow log (.slow.tsv)
+    --slow-threshold=SECS   Slow log threshold in seconds (default 0.5)
+
+Usage:
+    if __name__ == "__main__":
+        with profiling_session("sync_notes"):
+            main()
+
+    with timed("parse", relative_path, size):
+        content = frontmatter.loads(raw)
+
+    with timed("download", filename) as info:
+        response = client.get(url)
+        info["size"] = len(response.content)
+
+    # Work that waits on a queue or lock should report only its own time
+    record("upload", relative_path, size, elapsed)
+"""
+
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+# Configuration
+REPO_ROOT = Path(__file__).parent.parent
+PROFILES_DIR = REPO_ROOT / "profiles"
+DEFAULT_SLOW_THRESHOLD = 0.5  # Seconds
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+# The session for the running script, if profiling is enabled
+_active = None
+
+
+def threshold_usage_error(message: str) -> None:
+    """Print a --slow-threshold usage error and exit."""
+    print(f"Error: {message}")
+    print("Usage: --slow-threshold=SECS (e.g. --slow-threshold=0.2)")
+    sys.exit(2)
+
+
+def parse_threshold(value: str) -> float:
+    """Parse --slow-threshold, exiting with a usage error if it's invalid."""
+    try:
+        threshold = float(value)
+    except ValueError:
+        threshold = -1.0
+    if not threshold >= 0:
+        threshold_usage_error(f"--slow-threshold expects a number of seconds, got {value!r}")
+    return threshold
+
+
+class ProfilingSession:
+    """Profilers, memory tracing and slow log for one script run."""
+
+    def __init__(self, script: str, argv: list[str]):
+        self.script = script
+        self.profile = "--profile" in argv
+        self.trace_memory = "--trace-memory" in argv
+        self.slow_log = self.profile or self.trace_memory or "--slow-log" in argv
+        self.slow_threshold = DEFAULT_SLOW_THRESHOLD
+        for arg in argv:
+            if arg == "--slow-threshold":
+                # The scripts treat a separate value as a file argument, so
+                # "--slow-threshold 0.2" would silently change what runs
+                threshold_usage_error("--slow-threshold needs its value after '=', not a space")
+            if arg.startswith("--slow-threshold="):
+                self.slow_threshold = parse_threshold(arg.split("=", 1)[1])
+
+        self.enabled = self.slow_log
+        self.profilers = []
+        self.slow_entries = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.profile:
+            self._start_profiler()
+            if sys.version_info < (3, 12):
+                # cProfile only sees the thread that enabled it before 3.12,
+                # so give each worker thread its own profiler
+                threading.setprofile(self._start_thread_profiler)
+        if self.trace_memory:
+            tracemalloc.start(10)
+
+    def _start_profiler(self) -> None:
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profilers.append(profiler)
+        profiler.enable()
+
+    def _start_thread_profiler(self, frame, event, arg) -> None:
+        sys.setprofile(None)
+        self._start_profiler()
+
+    def record(self, stage: str, item: str, size: int | None, elapsed: float) -> None:
+        """Add an item to the slow log if it crossed the threshold."""
+        if elapsed < self.slow_threshold:
+            return
+        with self._lock:
+            self.slow_entries.append((elapsed, stage, item, size))
+
+    def stop(self) -> None:
+        """Stop profiling and write all enabled reports."""
+        threading.setprofile(None)
+        for profiler in self.profilers:
+            profiler.disable()
+
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        base = PROFILES_DIR / f"{self.script}-{stamp}"
+        written = []
+
+        if self.profile:
+            written += self._write_profile(base)
+        if self.trace_memory:
+            written.append(self._write_memory(base))
+            tracemalloc.stop()
+        if self.slow_log:
+            written.append(self._write_slow_log(base))
+
+        print()
+        print("Profiling reports:")
+        for path in written:
+            print(f"  {path.relative_to(REPO_ROOT)}")
+
+    def _write_profile(self, base: Path) -> list[Path]:
+        stats = pstats.Stats(self.profilers[0])
+        for profiler in self.profilers[1:]:
+            stats.add(profiler)
+
+        dump_path = base.with_suffix(".prof")
+        stats.dump_stats(dump_path)
+
+        summary = io.StringIO()
+        pstats.Stats(str(dump_path), stream=summary).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        summary_path = base.with_suffix(".txt")
+        summary_path.write_text(summary.getvalue())
+
+        return [dump_path, summary_path]
+
+    def _write_memory(self, base: Path) -> Path:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+
+        lines = [
+            f"Current: {current / 1024:.1f} KiB",
+            f"Peak: {peak / 1024:.1f} KiB",
+            "",
+            f"Top {TOP_ALLOCATIONS} allocations by line:",
+        ]
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+
+        mem_path = base.with_suffix(".mem.txt")
+        mem_path.write_text("\n".join(lines) + "\n")
+        return mem_path
+
+    def _write_slow_log(self, base: Path) -> Path:
+        lines = [f"# threshold {self.slow_threshold}s", "seconds\tstage\tbytes\titem"]
+        for elapsed, stage, item, size in sorted(self.slow_entries, reverse=True):
+            lines.append(f"{elapsed:.3f}\t{stage}\t{'' if size is None else size}\t{item}")
+
+        slow_path = base.with_suffix(".slow.tsv")
+        slow_path.write_text("\n".join(lines) + "\n")
+        return slow_path
+
+
+@contextmanager
+def profiling_session(script: str, argv: list[str] = None):
+    """Run a script body under whatever profiling its flags ask for."""
+    global _active
+    session = ProfilingSession(script, argv if argv is not None else sys.argv[1:])
+    if not session.enabled:
+        yield None
+        return
+
+    _active = session
+    session.start()
+    try:
+        yield session
+    finally:
+        session.stop()
+        _active = None
+
+
+def record(stage: str, item: str, size: int | None, elapsed: float) -> None:
+    """Report an already-measured duration to the slow log (no-op when not profiling)."""
+    if _active is not None:
+        _active.record(stage, str(item), size, elapsed)
+
+
+@contextmanager
+def timed(stage: str, item: str, size: int = None):
+    """
+    Time one item of work for the slow log (a no-op when not profiling).
+    Yields a dict whose "size" can be filled in when it is only known
+    inside the block (e.g. after a download).
+    """
+    info = {"size": size}
+    if _active is None:
+        yield info
+        return
+
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        _active.record(stage, str(item), info["size"], time.perf_counter() - start)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+vault_scanner.py - Cached scan of the JD folders for markdown notes
+
+This module:
+1. Walks the JD folders with os.scandir (one stat per directory)
+2. Caches each directory's mtime and entry list in _scan_cache.json
+3. Re-lists only directories whose mtime changed since the last run
+4. Yields (path, size, mtime) records in a stable, sorted order
+
+On a vault that lives on a network or synced drive this replaces a stat
+per note with a stat per directory.
+
+Like git's "racily clean" check, a cached listing is only trusted if the
+directory's mtime is older than the time it was listed by more than the
+filesystem's timestamp granularity. Otherwise a file created in the same
+mtime tick as the listing (common on FAT/exFAT and SMB, which use 1-2s
+ticks) would never show up.
+
+Usage:
+    from vault_scanner import scan_notes
+    for entry in scan_notes():
+        print(entry.path, entry.size, entry.mtime)
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+# Configuration
+REPO_ROOT = Path(__file__).parent.parent
+SECOND_BRAIN = REPO_ROOT / "second-brain"
+SCAN_CACHE_FILE = SECOND_BRAIN / "_scan_cache.json"
+CACHE_VERSION = 2
+
+# Coarsest directory mtime tick we expect (FAT/exFAT use 2s), plus slack
+# for clock skew between this machine and a network share
+MTIME_GRANULARITY_NS = 3_000_000_000
+
+# JD folders to scan (exclude inbox)
+JD_FOLDERS = [
+    "00-index",
+    "10-reference",
+    "20-projects",
+    "30-people",
+    "40-media",
+    "50-events",
+    "60-ideas",
+    "70-home",
+    "80-personal",
+    "90-archive",
+]
+
+
+class NoteEntry(NamedTuple):
+    """
+    A markdown file found by the scanner.
+
+    size and mtime come from the last time the file's directory was listed.
+    Editing a file in place doesn't change its directory's mtime, so for
+    cached directories they can be stale: use them for reporting only,
+    never for change detection (stat or read the file for that).
+    """
+    path: Path
+    size: int
+    mtime: float
+
+
+def load_scan_cache() -> dict:
+    """Load the directory cache from _scan_cache.json."""
+    if SCAN_CACHE_FILE.exists():
+        try:
+            with open(SCAN_CACHE_FILE, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") == CACHE_VERSION:
+                return cache
+        except (OSError, ValueError):
+            pass
+    return {"version": CACHE_VERSION, "dirs": {}}
+
+
+def save_scan_cache(cache: dict) -> None:
+    """Save the directory cache to _scan_cache.json."""
+    with open(SCAN_CACHE_FILE, "w") as f:
+        json.dump(cache, f)
+
+
+def list_directory(dirpath: Path) -> dict:
+    """List a directory's subdirectories and markdown files."""
+    dirs = []
+    files = {}
+    with os.scandir(dirpath) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.name)
+            elif entry.name.endswith(".md") and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = [stat.st_size, stat.st_mtime]
+    return {"dirs": sorted(dirs), "files": files}
+
+
+def is_clean(cached: dict, mtime_ns: int) -> bool:
+    """
+    Whether a cached listing can be reused for a directory with this mtime.
+    A listing taken within one mtime tick of the directory's last change is
+    "racily clean": a later change in the same tick wouldn't move the mtime,
+    so it is re-listed until the directory has been quiet for a full tick.
+    """
+    return (
+        cached["mtime_ns"] == mtime_ns
+        and mtime_ns < cached["listed_at_ns"] - MTIME_GRANULARITY_NS
+    )
+
+
+def scan_directory(dirpath: Path, old_dirs: dict, new_dirs: dict) -> Iterator[NoteEntry]:
+    """Yield notes under dirpath, re-listing it only if its mtime changed."""
+    try:
+        mtime_ns = os.stat(dirpath).st_mtime_ns
+    except FileNotFoundError:
+        return
+
+    key = dirpath.relative_to(SECOND_BRAIN).as_posix()
+    cached = old_dirs.get(key)
+    if cached and is_clean(cached, mtime_ns):
+        listing = cached
+    else:
+        listed_at_ns = time.time_ns()
+        listing = list_directory(dirpath)
+        listing["mtime_ns"] = mtime_ns
+        listing["listed_at_ns"] = listed_at_ns
+    new_dirs[key] = listing
+
+    # Interleave files and subdirectories by name so the overall order
+    # matches a sorted list of full paths
+    children = [(name, False) for name in listing["files"]]
+    children += [(name, True) for name in listing["dirs"]]
+    for name, is_dir in sorted(children):
+        if is_dir:
+            yield from scan_directory(dirpath / name, old_dirs, new_dirs)
+        else:
+            size, mtime = listing["files"][name]
+            yield NoteEntry(dirpath / name, size, mtime)
+
+
+def scan_notes(folders: list[str] = JD_FOLDERS, use_cache: bool = True) -> Iterator[NoteEntry]:
+    """
+    Yield every markdown note in the JD folders as (path, size, mtime).
+    The cache is rewritten once the iterator is exhausted; directories that
+    have disappeared drop out of it, and folders not scanned are kept as-is.
+    """
+    old_dirs = load_scan_cache()["dirs"] if use_cache else {}
+    new_dirs = {}
+
+    for folder in sorted(folders):
+        yield from scan_directory(SECOND_BRAIN / folder, old_dirs, new_dirs)
+
+    if use_cache:
+        for key, listing in old_dirs.items():
+            if key.split("/")[0] not in folders:
+                new_dirs[key] = listing
+        save_scan_cache({"version": CACHE_VERSION, "dirs": new_dirs})